@@ -10,4 +10,5 @@ def print_color_chart():
         print(f'\033[38;5;{i}m {i:3}\033[0m', end=' ')
     print('\033[0m')
 
-print_color_chart()
+if __name__ == "__main__":
+    print_color_chart()
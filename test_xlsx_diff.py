@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+import xlsx_diff
+
+
+def repetitive_sheet(rows, changed_row=None):
+    """Two columns of low-cardinality values, like flag and category columns."""
+    lines = []
+    locations = []
+    for i in range(1, rows + 1):
+        for column, value in (('A', i % 2), ('B', i % 5)):
+            if i == changed_row and column == 'B':
+                value = 9
+            lines.append(f"{value}\n")
+            locations.append(f"{column}{i}")
+    return [lines, locations]
+
+
+class CompareDirsTest(unittest.TestCase):
+
+    def assert_single_cell_change(self, rows):
+        summaries_from = {'Sheet1': repetitive_sheet(rows)}
+        summaries_to = {'Sheet1': repetitive_sheet(rows, changed_row=rows // 2)}
+        diff = list(xlsx_diff.compare_dirs(summaries_from, summaries_to, 'a.xlsx', 'b.xlsx', [], []))
+
+        hunks = [line for line in diff if line.startswith('@@')]
+        changed = [line for line in diff if line[:1] in '+-' and not line.startswith(('---', '+++'))]
+        self.assertEqual(len(hunks), 1)
+        self.assertEqual(changed, [f"-{rows // 2 % 5}\n", "+9\n"])
+
+    def test_one_cell_change_in_repetitive_sheet_is_one_small_hunk(self):
+        for rows in (150, 5000):
+            with self.subTest(rows=rows):
+                self.assert_single_cell_change(rows)
+
+    def test_one_cell_change_without_rapidfuzz(self):
+        with mock.patch.object(xlsx_diff, 'Indel', None):
+            for rows in (150, 5000):
+                with self.subTest(rows=rows):
+                    self.assert_single_cell_change(rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
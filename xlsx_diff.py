@@ -1,168 +1,361 @@
 #!/usr/bin/env python3
 import sys
+import functools
 import zipfile
 import os
-import tempfile
+import posixpath
 import re
-import subprocess
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 from difflib import SequenceMatcher
-from lxml import etree as ET
 
-XMLNS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:  # fall back to the C-accelerated stdlib parser
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+try:
+    from rapidfuzz.distance import Indel
+except ImportError:  # fall back to difflib's pure-Python SequenceMatcher
+    Indel = None
 
-def build_shared_strings_map(shared_strings_xml_content):
-    # Encode the content to bytes
-    shared_strings_xml_bytes = shared_strings_xml_content.encode('utf-8')
-    tree = ET.fromstring(shared_strings_xml_bytes)
+XMLNS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELS_XMLNS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+_COL_RE = re.compile(r'([A-Z]+)\d+')
+# Undoes the \n and \r escaping applied to cell values in summarize_sheet
+_LF_TRANS = re.compile(r'\\[nr]')
+_LF_REPLACEMENTS = {'\\n': '\n ', '\\r': '\r'}
+
+# Below this much uncompressed sheet XML, starting worker processes costs more than it saves
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+# Without rapidfuzz, the pure-Python edit-script search gives up beyond this many inserted/deleted lines
+MAX_EDITS = 2000
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+BLUE = '\033[94m'
+GRAY = '\033[38;5;232m'  #'\033[90m'
+RESET = '\033[0m'
+
+def _iterparse(source, tag):
+    """Yield each completed `tag` element, discarding it once the caller moves on."""
+    if HAS_LXML:
+        for _, elem in ET.iterparse(source, events=('end',), tag=tag, huge_tree=True):
+            yield elem
+            # Drop the element and everything before it to keep memory flat
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    else:
+        # The stdlib parser has no tag filter or parent links, so filter here and
+        # track open elements to detach each finished one from its parent
+        open_elements = []
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                open_elements.append(elem)
+                continue
+            open_elements.pop()
+            if elem.tag == tag:
+                yield elem
+                elem.clear()
+                if open_elements:
+                    open_elements[-1].remove(elem)
+
+def build_shared_strings_map(shared_strings_file):
     shared_strings = {}
 
-    for index, si in enumerate(tree.findall(XMLNS + 'si')):
+    for index, si in enumerate(_iterparse(shared_strings_file, XMLNS + 'si')):
         t = si.find(XMLNS + 't')
         if t is not None:
-            shared_strings[index] = t.text
+            shared_strings[index] = sys.intern(t.text) if t.text is not None else None
+        else:
+            # Rich text strings are split into runs, each with its own <t>
+            runs = [run.find(XMLNS + 't') for run in si if run.tag == XMLNS + 'r']
+            if runs:
+                shared_strings[index] = sys.intern(''.join(t.text or '' for t in runs if t is not None))
 
     return shared_strings
 
-def replace_shared_strings_in_sheet(sheet_xml_content, shared_strings):
-    # Encode the content to bytes
-    sheet_xml_bytes = sheet_xml_content.encode('utf-8')
-    tree = ET.fromstring(sheet_xml_bytes)
-
-    for c in tree.findall('.//' + XMLNS + 'c[@t="s"]'):  # cells with shared strings
-        v = c.find(XMLNS + 'v')  # the <v> tag inside <c> holds the index
-        if v is not None and v.text is not None:
-            index = int(v.text)
-            if index in shared_strings:
-                v.text = shared_strings[index]
+def _col_to_int(name):
+    """Convert Excel column letters to a 1-based index ('A' -> 1, 'AA' -> 27)."""
+    n = 0
+    for char in name:
+        n = n * 26 + ord(char) - 64
+    return n
+
+@functools.lru_cache(maxsize=16384)  # Excel's column limit
+def _int_to_col(n):
+    """Convert a 1-based column index back to Excel column letters."""
+    name = ''
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+def summarize_sheet(sheet_file, shared_strings):
+    """Stream a sheet file row by row, resolving shared strings inline."""
+    elements_text = [] # String to store summary for this file
+    location = []
+    row_number = 0
+
+    for row in _iterparse(sheet_file, XMLNS + 'row'):
+        row_number = int(row.get('r')) if row.get('r') is not None else row_number + 1
+        last_cell_location = None
+        last_column_int = 0
+        # Iterate through cells
+        for cell in row:
+            if cell.tag != XMLNS + 'c':
+                continue
+            cell_location = cell.get('r')  # Get the cell's location
+            if cell_location is not None:
+                last_cell_location = cell_location
+                last_column_int = None  # only parsed if a following cell lacks 'r'
+            else:
+                if last_column_int is None:
+                    last_column_int = _col_to_int(_COL_RE.match(last_cell_location).group(1))
+                # Increment the column and keep the row number
+                last_column_int += 1
+                cell_location = _int_to_col(last_column_int) + str(row_number)
+            value = cell[0] if len(cell) > 0 else None
+            if value is None or value.text is None:
+                continue
+            text = value.text
+            if cell.get('t') == 's':  # the <v> tag holds an index into the shared strings
+                text = shared_strings.get(int(text), text)
+            if text is not None:
+                # Interned so repeated values (labels, categories) share one string object
+                elements_text.append(sys.intern(text.replace('\n', '\\n').replace('\r', '\\r') + "\n"))
+                location.append(cell_location)
+
+    return [elements_text, location]
+
+def open_xlsx_member(zip_ref, member_name):
+    """Open a file inside the xlsx archive without extracting it to disk."""
+    return zip_ref.open(member_name)
+
+def replace_shared_strings(zip_ref):
+    with open_xlsx_member(zip_ref, 'xl/sharedStrings.xml') as f:
+        return build_shared_strings_map(f)
+
+def get_sheet_names(zip_ref):
+    """Map each sheet's archive member to its name, in workbook order.
+
+    Sheet files are not guaranteed to be named after their sheetId, so the
+    file for each sheet is resolved through its r:id in workbook.xml.rels.
+    """
+    targets = {}
+    with open_xlsx_member(zip_ref, 'xl/_rels/workbook.xml.rels') as f:
+        for rel in _iterparse(f, RELS_XMLNS + 'Relationship'):
+            target = rel.get('Target')
+            # Targets are relative to xl/ unless they are absolute within the package
+            if target.startswith('/'):
+                targets[rel.get('Id')] = target.lstrip('/')
+            else:
+                targets[rel.get('Id')] = posixpath.normpath(posixpath.join('xl', target))
 
-    return ET.tostring(tree, encoding='utf-8').decode('utf-8')
-
-def replace_shared_strings(directory):
-    shared_strings_path = os.path.join(directory, 'xl', 'sharedStrings.xml')
-    with open(shared_strings_path, 'r', encoding='utf-8') as f:
-        shared_strings_content = f.read()
-        
-    shared_strings = build_shared_strings_map(shared_strings_content)
-
-    modified_sheets = {}
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if re.match(r'^sheet\d+\.xml$', file):
-                sheet_path = os.path.join(root, file)
-                with open(sheet_path, 'r', encoding='utf-8') as f:
-                    sheet_content = f.read()
-                modified_content = replace_shared_strings_in_sheet(sheet_content, shared_strings)
-                modified_sheets[sheet_path] = modified_content
-
-    return modified_sheets
-
-def unpack_xlsx(xlsx_path, output_dir):
-    with zipfile.ZipFile(xlsx_path, 'r') as zip_ref:
-        zip_ref.extractall(output_dir)
-
-def get_sheet_names(directory):
-    """Extract the sheet names from the workbook.xml file."""
-    workbook_path = os.path.join(directory, 'xl', 'workbook.xml')
-    tree = ET.parse(workbook_path)
-    root = tree.getroot()
-
-    # Extract the sheet names and map them to the sheet IDs
     sheet_names = {}
-    for sheet in root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet'):
-        sheet_id = sheet.get('sheetId')
-        sheet_name = sheet.get('name')
-        sheet_names[sheet_id] = sheet_name
+    with open_xlsx_member(zip_ref, 'xl/workbook.xml') as f:
+        for sheet in _iterparse(f, XMLNS + 'sheet'):
+            member_name = targets.get(sheet.get(R_ID))
+            if member_name is not None:
+                sheet_names[member_name] = sheet.get('name')
 
     return sheet_names
 
-def get_next_excel_column_name(column_name):
-    result = ""
-    carry = 1
-    for char in reversed(column_name):
-        new_char_val = ord(char) - ord('A') + carry
-        carry = new_char_val // 26
-        result = chr(ord('A') + new_char_val % 26) + result
-    if carry:
-        result = 'A' + result
-    return result
-
-def get_letters(s):
-    return ''.join([c for c in s if c.isalpha()])
-
-def summarize_sheet_files(modified_sheets, sheet_names):
-    summaries = {} # Dictionary to store summaries
-    pattern = re.compile(r'([A-Z]+)\d+')
-
-    for sheet_path, sheet_content in modified_sheets.items():
-      # Extract the sheet ID from the file name and get the corresponding sheet name
-        sheet_id = re.search(r'sheet(\d+)\.xml', sheet_path).group(1)
-        sheet_name = sheet_names.get(sheet_id, '')
-        xml_root = ET.fromstring(sheet_content.encode('utf-8'))
-
-        elements_text = [] # String to store summary for this file
-        location = []
-        row_number = 0
-
-        for row in xml_root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}row'):
-            row_number = int(row.get('r')) if row.get('r') is not None else row_number + 1
-            last_cell_location = None
-            last_column_letter = None
-            # Iterate through cells
-            for cell in row.findall('{http://schemas.openxmlformats.org/spreadsheetml/2006/main}c'):
-                cell_location = cell.get('r')  # Get the cell's location
-                if cell_location is not None:
-                    last_cell_location = cell_location
-                elif last_cell_location is not None:
-                    # Increment the column letter and keep the row number
-                    # last_column_letter = get_letters(cell_location)
-                    last_column_letter = pattern.match(last_cell_location).group(1)
-                    last_column_letter = get_next_excel_column_name(last_column_letter)
-                    cell_location = last_column_letter + str(row_number)
-                else:
-                    last_column_letter = 'A'
-                    cell_location = last_column_letter + str(row_number)
-                    last_cell_location =  cell_location
-                value = cell[0] if len(cell) > 0 else None
-                if value is not None and value.text is not None:
-                    text = value.text.replace('\n', '\\n').replace('\r', '\\r') + "\n"
-                    elements_text.append(text)
-                    location.append(cell_location)
-
-        summaries[ sheet_name ] = [elements_text, location] # Store summary in dictionary
-
-    return summaries
-
-def diff_files(lines_from, lines_to, file_from_name, file_to_name):
+_worker_zip = None
+_worker_shared_strings = None
 
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False) as file_from, tempfile.NamedTemporaryFile(mode='w+', delete=False) as file_to:
-        file_from.write(''.join(lines_from))
-        file_to.write(''.join(lines_to))
-        file_from.flush()
-        file_to.flush()
+def _init_worker(xlsx_path, shared_strings):
+    # Each worker opens the archive once and receives the shared strings once,
+    # instead of pickling them per task
+    global _worker_zip, _worker_shared_strings
+    _worker_zip = zipfile.ZipFile(xlsx_path, 'r')
+    _worker_shared_strings = shared_strings
 
-    command = ["git", "diff", "--no-index", file_from.name, file_to.name]
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+def _parse_sheet(member_name):
+    with open_xlsx_member(_worker_zip, member_name) as f:
+        return summarize_sheet(f, _worker_shared_strings)
 
-    if result.returncode not in (0, 1):
-        print(f"An error occurred while running git diff: {result.stderr}")
-        return []
-
-    diff_output = result.stdout.splitlines(True)[2:]
+def summarize_sheet_files(zip_ref, shared_strings, sheet_names):
+    summaries = {} # Dictionary to store summaries
 
-    if len(diff_output) > 1:
-        diff_output[0] = '--- ' + file_from_name + '\n'
-        diff_output[1] = '+++ ' + file_to_name + '\n'
+    members = set(zip_ref.namelist())
+    sheet_members = [name for name in sheet_names if name in members]
+    sheet_keys = [sheet_names[name] for name in sheet_members]
+
+    # Sheets are independent once the shared strings are known, so parse large workbooks in parallel.
+    # Workers reopen the archive by path, so archives built from file objects are parsed serially.
+    max_workers = min(len(sheet_members), os.cpu_count() or 1)
+    sheet_bytes = sum(zip_ref.getinfo(name).file_size for name in sheet_members)
+    if max_workers > 1 and sheet_bytes >= PARALLEL_MIN_BYTES and zip_ref.filename is not None:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(zip_ref.filename, shared_strings)) as executor:
+            results = list(executor.map(_parse_sheet, sheet_members))
+    else:
+        results = []
+        for name in sheet_members:
+            with open_xlsx_member(zip_ref, name) as f:
+                results.append(summarize_sheet(f, shared_strings))
+
+    for sheet_name, summary in zip(sheet_keys, results):
+        summaries[ sheet_name ] = summary # Store summary in dictionary
 
-    #you can remove the temporary files from here if they are no longer needed
-    os.remove(file_from.name)
-    os.remove(file_to.name)
+    return summaries
 
-    return diff_output
+def _myers_distance(a, b, max_edits, keep_trace=False):
+    """Myers' O(ND) search for the fewest insertions and deletions turning a into b.
+
+    Returns (distance, trace), where trace holds the furthest-reaching x per
+    diagonal at the start of each round when keep_trace is set, or None if
+    more than max_edits edits are needed.
+    """
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        if keep_trace:
+            trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]  # step down: insert from b
+            else:
+                x = v[offset + k - 1] + 1  # step right: delete from a
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return d, trace
+    return None
+
+def _myers_opcodes(a, b, max_edits):
+    """SequenceMatcher-style opcodes for a shortest edit script, or None if it is too long."""
+    found = _myers_distance(a, b, max_edits, keep_trace=True)
+    if found is None:
+        return None
+    _, trace = found
+
+    # Walk the trace backwards, collecting one step per line
+    steps = []
+    x, y = len(a), len(b)
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]  # covers diagonals -d-1 .. d+1
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            steps.append(('equal', x, y))
+        if d > 0:
+            steps.append(('insert', prev_x, prev_y) if x == prev_x else ('delete', prev_x, prev_y))
+        x, y = prev_x, prev_y
+
+    opcodes = []
+    for tag, i, j in reversed(steps):
+        i2 = i + (tag != 'insert')
+        j2 = j + (tag != 'delete')
+        if opcodes and opcodes[-1][0] == tag:
+            opcodes[-1] = (tag, opcodes[-1][1], i2, opcodes[-1][3], j2)
+        else:
+            opcodes.append((tag, i, i2, j, j2))
+    return opcodes
+
+def _common_affixes(a, b):
+    """Length of the common prefix and suffix of a and b, without overlapping."""
+    limit = min(len(a), len(b))
+    prefix = 0
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+def _merge_changes(opcodes):
+    """Coalesce adjacent delete/insert opcodes into single replace opcodes."""
+    merged = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if merged and tag != 'equal' and merged[-1][0] != 'equal':
+            _, i1, _, j1, _ = merged.pop()
+        if tag != 'equal':
+            tag = 'replace' if i1 < i2 and j1 < j2 else ('delete' if i1 < i2 else 'insert')
+        merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+def diff_opcodes(lines_from, lines_to):
+    """Opcodes for a minimal line diff, in the format of SequenceMatcher.get_opcodes().
+
+    difflib's own matching is not used directly: its autojunk heuristic drops
+    frequent lines as anchors, which turns a one-cell change in a repetitive
+    sheet into a delete and re-add of the whole sheet.
+    """
+    if Indel is not None:
+        return _merge_changes(Indel.opcodes(lines_from, lines_to).as_list())
+
+    # Changes are usually a few lines in a large sheet, so only search the part that differs
+    prefix, suffix = _common_affixes(lines_from, lines_to)
+    middle_from = lines_from[prefix:len(lines_from) - suffix]
+    middle_to = lines_to[prefix:len(lines_to) - suffix]
+    middle = _myers_opcodes(middle_from, middle_to, MAX_EDITS)
+    if middle is None:
+        # Too many edits for the Python search; difflib without autojunk still anchors on every line
+        middle = SequenceMatcher(None, middle_from, middle_to, autojunk=False).get_opcodes()
+
+    opcodes = [('equal', 0, prefix, 0, prefix)] if prefix else []
+    opcodes.extend((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in middle)
+    if suffix:
+        opcodes.append(('equal', len(lines_from) - suffix, len(lines_from), len(lines_to) - suffix, len(lines_to)))
+    return _merge_changes(opcodes)
+
+def group_opcodes(opcodes, n=3):
+    """Split opcodes into hunks with n lines of context, like SequenceMatcher.get_grouped_opcodes()."""
+    codes = list(opcodes) or [('equal', 0, 1, 0, 1)]
+    # Trim the leading and trailing context to n lines
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == 'equal':
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == 'equal':
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # End the hunk at an unchanged run longer than twice the context
+        if tag == 'equal' and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+def format_hunk_range(start, stop):
+    """Format a 0-based [start, stop) line range the way unified diff headers do."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1  # empty ranges point at the line before the change
+    return f"{beginning},{length}"
 
 def compare_dirs(summaries_from, summaries_to, file_from, file_to, removed_sheets, renamed_sheets):
-    differences = []
-
+    """Yield the annotated diff lines sheet by sheet."""
     for file_name in summaries_from.keys():
 
         index = next((i for i, item in enumerate(renamed_sheets) if item[0] == file_name), None)
@@ -177,59 +370,76 @@ def compare_dirs(summaries_from, summaries_to, file_from, file_to, removed_sheet
         lines_to = summaries_to.get(file_name_to, [])[0]
         locations_from = summaries_from.get(file_name, [])[1]
         locations_to = summaries_to.get(file_name_to, [])[1]
-        diff_list = diff_files(lines_from, lines_to, file_from_name=file_from + ' ' + file_name, file_to_name=file_to + ' ' + file_name_to)
-        diff_list_final = list(diff_list)
-
-        # Each item in 'line_changes' is a tuple of four integers: from_start, from_count, to_start, to_count
-        line_changes = []
-        for index, line in enumerate(diff_list):
-            match = re.match(r'@@ -(?P<from_start>\d+)(,(?P<from_count>\d+))? \+(?P<to_start>\d+)(,(?P<to_count>\d+))? @@', line)
-            if match:
-                from_start = int(match.group('from_start'))
-                from_count = int(match.group('from_count')) if match.group('from_count') else 1  # handle case where count is blank: @@ -1 +1,2 @@
-                to_start = int(match.group('to_start'))
-                to_count = int(match.group('to_count')) if match.group('to_count') else 1 
-                line_changes.append((from_start, from_count, to_start, to_count, index)) 
-
-        offset = 0
-        for change in line_changes:
-            from_start, from_count, to_start, to_count, index_start = change
-            locations_from_subset = locations_from[from_start - 1:from_start - 1 + from_count]
-            locations_to_subset = locations_to[to_start - 1:to_start - 1 + to_count]
-
-            gray = '\033[38;5;232m'  #'\033[90m'
-            reset_format = '\033[0m'
-
-            i = 0
-            j = 0
-            idx = index_start + offset + 1
-            while i < from_count or j < to_count:
-                line = diff_list_final[idx]
-                if line.startswith('-'):
-                    diff_list_final.insert(idx, gray + "(-" + locations_from_subset[i] + ")" + reset_format + "\n")
-                    i += 1
-                elif line.startswith('+'):
-                    diff_list_final.insert(idx, gray + "(+" + locations_to_subset[j] + ")" + reset_format + "\n")
-                    j += 1
-                else:
-                    diff_list_final.insert(idx, gray + "(-" + locations_from_subset[i] + " +" + locations_to_subset[j] + ")" + reset_format + "\n")
-                    i += 1
-                    j += 1
-                idx +=2
-                offset += 1
-
-        differences.extend(diff_list_final)
-
-    return differences
-
-def similarity(content_from, content_to):
-    return SequenceMatcher(None, content_from, content_to).ratio()
+
+        # Emit the unified diff straight from the opcodes, each line preceded by its cell location(s)
+        for hunk_index, group in enumerate(group_opcodes(diff_opcodes(lines_from, lines_to), 3)):
+            if hunk_index == 0:
+                yield '--- ' + file_from + ' ' + file_name + '\n'
+                yield '+++ ' + file_to + ' ' + file_name_to + '\n'
+            first, last = group[0], group[-1]
+            yield '@@ -' + format_hunk_range(first[1], last[2]) + ' +' + format_hunk_range(first[3], last[4]) + ' @@\n'
+
+            for tag, i1, i2, j1, j2 in group:
+                if tag == 'equal':
+                    for i, j in zip(range(i1, i2), range(j1, j2)):
+                        yield GRAY + "(-" + locations_from[i] + " +" + locations_to[j] + ")" + RESET + "\n"
+                        yield ' ' + lines_from[i]
+                    continue
+                if tag in ('replace', 'delete'):
+                    for i in range(i1, i2):
+                        yield GRAY + "(-" + locations_from[i] + ")" + RESET + "\n"
+                        yield '-' + lines_from[i]
+                if tag in ('replace', 'insert'):
+                    for j in range(j1, j2):
+                        yield GRAY + "(+" + locations_to[j] + ")" + RESET + "\n"
+                        yield '+' + lines_to[j]
+
+def could_be_similar(length_from, length_to, threshold=0.5):
+    """Cheap upper bound on SequenceMatcher.ratio() from the sequence lengths alone."""
+    total = length_from + length_to
+    # ratio() is 2*matches/total and matches can't exceed the shorter sequence
+    return total == 0 or 2 * min(length_from, length_to) / total > threshold
+
+def similarity(content_from, content_to, score_cutoff=0.0):
+    """Score two line lists between 0 and 1, returning 0.0 for scores below score_cutoff.
+
+    Both paths compute the Indel similarity 1 - distance/total, where
+    distance counts inserted and deleted lines. Without rapidfuzz, pairs
+    needing more than MAX_EDITS edits are scored by an upper bound instead.
+    """
+    if Indel is not None:
+        return Indel.normalized_similarity(content_from, content_to, score_cutoff=score_cutoff)
+
+    total = len(content_from) + len(content_to)
+    if total == 0:
+        return 1.0
+
+    # Lines shared as a multiset bound the LCS from above, and are cheap to count
+    shared = sum((Counter(content_from) & Counter(content_to)).values())
+    upper_bound = 2 * shared / total
+    if upper_bound < score_cutoff:
+        return 0.0
+
+    # A score of at least score_cutoff allows at most this many edits
+    allowed = int(total * (1 - score_cutoff))
+    prefix, suffix = _common_affixes(content_from, content_to)
+    found = _myers_distance(content_from[prefix:len(content_from) - suffix],
+                            content_to[prefix:len(content_to) - suffix], min(allowed, MAX_EDITS))
+    if found is not None:
+        score = 1 - found[0] / total
+        return score if score >= score_cutoff else 0.0
+    if allowed <= MAX_EDITS:
+        return 0.0
+    # Too many edits to count exactly in Python; fall back to the bound
+    return upper_bound
 
 def compare_sheet_names(sheet_names_from, sheet_names_to, summaries_from, summaries_to):
     added_sheets = []
     removed_sheets = []
     renamed_sheets = []
 
+    lengths_to = {name: len(summaries_to.get(name, [])[0]) for name in sheet_names_to}
+
     # Check for removed or renamed sheets
     for name_from in sheet_names_from:
         content_from = summaries_from.get(name_from, [])[0]
@@ -237,8 +447,10 @@ def compare_sheet_names(sheet_names_from, sheet_names_to, summaries_from, summar
             is_renamed = False
             for name_to in sheet_names_to:
                 if name_to != name_from: # Ensure names are not the same
+                    if not could_be_similar(len(content_from), lengths_to[name_to]):
+                        continue
                     content_to = summaries_to.get(name_to, [])[0]
-                    if similarity(content_from, content_to) > 0.5:
+                    if similarity(content_from, content_to, score_cutoff=0.5) > 0.5:
                         renamed_sheets.append((name_from, name_to))
                         is_renamed = True
                         break # renamed sheet identified when first match found, so there shouldn't be a situation where the original sheet is identified as being renamed to multiple new names.
@@ -252,6 +464,9 @@ def compare_sheet_names(sheet_names_from, sheet_names_to, summaries_from, summar
 
     return added_sheets, removed_sheets, renamed_sheets
 
+def _unescape_line_break(match):
+    return _LF_REPLACEMENTS[match.group(0)]
+
 def custom_diff(summaries_from, summaries_to, file_from, file_to):
 
       # Get the sheet names from the summaries
@@ -265,32 +480,31 @@ def custom_diff(summaries_from, summaries_to, file_from, file_to):
 
     # Print added sheets
     for sheet in added_sheets:
-        print('\033[92m' + f"Sheet {sheet} has been added.\n", end='\033[0m')
+        print(GREEN + f"Sheet {sheet} has been added.\n", end=RESET)
 
     # Print removed sheets
     for sheet in removed_sheets:
-        print('\033[91m' + f"Sheet {sheet} has been removed.\n", end='\033[0m')
+        print(RED + f"Sheet {sheet} has been removed.\n", end=RESET)
 
     # Print renamed sheets
     for old_name, new_name in renamed_sheets:
-        print('\033[94m' + f"Sheet {old_name} has been renamed to {new_name}.\n", end='\033[0m')
+        print(BLUE + f"Sheet {old_name} has been renamed to {new_name}.\n", end=RESET)
 
 
     differences = compare_dirs(summaries_from, summaries_to, file_from, file_to, removed_sheets, renamed_sheets)
 
-    # Accumulate the colored lines
-    colored_lines = ""
+    # Write the colored lines as they are produced rather than accumulating them
+    write = sys.stdout.write
     for line in differences:
+        line = _LF_TRANS.sub(_unescape_line_break, line)
         if line.startswith('+'):
-            colored_lines += '\033[92m' + line.replace('\\n', '\n ').replace('\\r', '\r') + '\033[0m'
+            write(GREEN + line + RESET)
         elif line.startswith('-'):
-            colored_lines += '\033[91m' + line.replace('\\n', '\n ').replace('\\r', '\r') + '\033[0m'  # Red for removed lines
+            write(RED + line + RESET)  # Red for removed lines
         elif line.startswith('@@'):
-            colored_lines += '\033[94m' + line.replace('\\n', '\n ').replace('\\r', '\r') + '\033[0m'  # Blue for @@ lines
+            write(BLUE + line + RESET)  # Blue for @@ lines
         else:
-            colored_lines += line.replace('\\n', '\n ').replace('\\r', '\r')
-    # Print the result
-    print(colored_lines, end='')
+            write(line)
 
 
 if __name__ == "__main__":
@@ -301,22 +515,14 @@ if __name__ == "__main__":
         print(f"File {file_to} has been deleted.")
         sys.exit(0)
     
-    unpack_dir_from = tempfile.TemporaryDirectory( prefix= os.path.basename(file_from) + "_unpacked" )
-    unpack_dir_to = tempfile.TemporaryDirectory( prefix= os.path.basename(file_to) + "_unpacked" )
+    with zipfile.ZipFile(file_from, 'r') as zip_from, zipfile.ZipFile(file_to, 'r') as zip_to:
+        shared_strings_from = replace_shared_strings(zip_from)
+        shared_strings_to = replace_shared_strings(zip_to)
 
-    unpack_xlsx(file_from, unpack_dir_from.name)
-    unpack_xlsx(file_to, unpack_dir_to.name)
+        sheet_names_from = get_sheet_names(zip_from)
+        sheet_names_to = get_sheet_names(zip_to)
 
-    modified_sheet_from = replace_shared_strings(unpack_dir_from.name)
-    modified_sheet_to = replace_shared_strings(unpack_dir_to.name)
-
-    sheet_names_from = get_sheet_names(unpack_dir_from.name)
-    sheet_names_to = get_sheet_names(unpack_dir_to.name)
-
-    summaries_from = summarize_sheet_files(modified_sheet_from, sheet_names_from)
-    summaries_to = summarize_sheet_files(modified_sheet_to, sheet_names_to)
+        summaries_from = summarize_sheet_files(zip_from, shared_strings_from, sheet_names_from)
+        summaries_to = summarize_sheet_files(zip_to, shared_strings_to, sheet_names_to)
 
     custom_diff(summaries_from, summaries_to, file_from, file_to)
-
-    unpack_dir_from.cleanup()
-    unpack_dir_to.cleanup()